@@ -0,0 +1,495 @@
+#!/usr/bin/env python
+#-*- coding: utf-8 -*-
+#
+# BSD License
+# Copyright (c) 2011, Wang Qiang
+# All rights reserved.
+
+"""
+JQFuzz
+
+Differential test and benchmark of the JQSelect engines.
+
+Random documents and selectors, covering the selectStr specification of
+JQSelector, are evaluated by every engine and compared with the reference
+path, JQSelect -> processSingleSelector -> SelectOperationFactory on the
+raw html. The documents carry comments and processing instructions around
+and inside the root, PRUNE_TAGS subtrees no selector targets, and may
+declare a prefix and a default namespace used by some of their elements
+and attributes. The
+PRUNING_ENGINES, which drop them, are compared with the reference on the
+document rendered without them. Mismatches are shrunk to a minimal
+document and selector.
+
+Function list:
+
+failures, timings = fuzz(iterations=100, seed=None, engines=ENGINES,
+                         pruningEngines=PRUNING_ENGINES)
+document, selector = shrink(document, selector, engine, xml=True,
+                            strip=False)
+
+Command line:
+python JQFuzz.py [-n iterations] [--seed seed] [--engine name...]
+"""
+
+import sys
+import time
+import random
+import argparse
+
+import JQSelector as jqs
+from JQIndex import documentTerms, mayMatch
+
+
+# vocabulary of the random documents and selectors
+TAGS = ['div', 'p', 'span', 'a', 'ul', 'li', 'input']
+CLASSES = ['box', 'homepage', 'homepage-box', 'success', 'group']
+IDS = ['quote', 'test', 'domains']
+ATTRIBUTES = {'type': ['hidden', 'text'],
+              'name': ['domains', 'q', 'homepage-q'],
+              'title': ['a b', 'homepage', 'b']}
+OPERATORS = ['=', '|=', '*=', '~=', '!=', '^=', '$=']
+COMBINATORS = [' > ', ' + ', ' ~ ', ' ']
+
+
+def reference(html, selectStr):
+    """
+    elements = reference(html, selectStr)
+    The reference engine, each selector group parses the raw html.
+    @param html: input html/xml
+    @param selectStr: JQuery-like select string.
+    @return: elements, list of matched elements
+    """
+    elements = []
+    for selector in [s.strip() for s in selectStr.split(',')]:
+        elements += jqs.processSingleSelector(html, selector)
+    return elements
+
+
+def _parsedEngine(html, selectStr):
+    """Parse once with parseDocument, then select."""
+    return jqs.JQSelect(jqs.parseDocument(html), selectStr)
+
+
+def _keepEngine(html, selectStr):
+    """Keep only the subtrees which may match selectStr."""
+    return jqs.JQSelect(html, selectStr, keepSelector=selectStr)
+
+
+def _indexEngine(html, selectStr):
+    """Skip the document if the index says it can't match."""
+    if not mayMatch(documentTerms(html), selectStr):
+        return []
+    return jqs.JQSelect(html, selectStr)
+
+
+def _prunedEngine(html, selectStr):
+    """Drop the PRUNE_TAGS subtrees and comments while parsing."""
+    document = jqs.parseDocument(html, pruneTags=jqs.PRUNE_TAGS,
+                                 removeComments=True)
+    return jqs.JQSelect(document, selectStr)
+
+
+def _prunedKeepEngine(html, selectStr):
+    """Combine all the pruning options."""
+    return jqs.JQSelect(html, selectStr, pruneTags=jqs.PRUNE_TAGS,
+                        removeComments=True, keepSelector=selectStr)
+
+
+# engines which must give the same elements as reference
+ENGINES = {'JQSelect': jqs.JQSelect,
+           'parsed': _parsedEngine,
+           'keep': _keepEngine,
+           'index': _indexEngine}
+
+# engines which must give the same elements as reference on the document
+# without the PRUNE_TAGS subtrees and comments
+PRUNING_ENGINES = {'pruned': _prunedEngine,
+                   'prunedKeep': _prunedKeepEngine}
+
+# comment and processing instruction nodes of the document trees
+COMMENT = '!--'
+PI = '?'
+# namespace prefix of the document trees
+PREFIX = 'x'
+
+
+def randomDocument(rng, depth=4, children=4):
+    """
+    document = randomDocument(rng, depth, children)
+    Generate a random document tree.
+    @param rng: random.Random
+    @param depth: maximum depth of the tree
+    @param children: maximum number of children per element
+    @return: document, ['#document', namespaces, nodes] with the
+             namespace declarations of the root, and the body element
+             between the comments and processing instructions before and
+             after the root, each node a [tag, attributes, children]
+    """
+    namespaces = []
+    if rng.random() < 0.3:
+        namespaces.append(('xmlns:' + PREFIX, 'urn:x'))
+        if rng.random() < 0.5:
+            namespaces.append(('xmlns', 'urn:d'))
+    body = ['body', [], []]
+    _randomChildren(rng, body, depth, children, bool(namespaces))
+    nodes = [body]
+    for i in range(rng.randint(0, 2)):
+        nodes.insert(0, [rng.choice([COMMENT, PI]), [], []])
+    for i in range(rng.randint(0, 2)):
+        nodes.append([rng.choice([COMMENT, PI]), [], []])
+    return ['#document', namespaces, nodes]
+
+
+def _randomChildren(rng, parent, depth, children, prefixed=False):
+    """
+    Append random children to parent, some of them in the PREFIX
+    namespace if prefixed.
+    """
+    if depth <= 0:
+        return
+    for i in range(rng.randint(0, children)):
+        if rng.random() < 0.15:
+            parent[2].append(_randomPrunable(rng))
+            continue
+        attributes = []
+        if rng.random() < 0.5:
+            attributes.append(('class', ' '.join(
+                rng.sample(CLASSES, rng.randint(1, 2)))))
+        if rng.random() < 0.2:
+            attributes.append(('id', rng.choice(IDS)))
+        for name in sorted(ATTRIBUTES):
+            if rng.random() < 0.2:
+                attributes.append((name, rng.choice(ATTRIBUTES[name])))
+        tag = rng.choice(TAGS)
+        if prefixed and rng.random() < 0.3:
+            tag = PREFIX + ':' + tag
+        if prefixed and rng.random() < 0.2:
+            attributes.append((PREFIX + ':title',
+                               rng.choice(ATTRIBUTES['title'])))
+        element = [tag, attributes, []]
+        parent[2].append(element)
+        _randomChildren(rng, element, depth - 1, children, prefixed)
+
+
+def _randomPrunable(rng):
+    """Return a comment, processing instruction or PRUNE_TAGS subtree."""
+    tag = rng.choice([COMMENT, PI] + list(jqs.PRUNE_TAGS))
+    if tag != 'svg':
+        return [tag, [], []]
+    # selectors never target svg content, but it may carry classes
+    return [tag, [], [['g', [('class', rng.choice(CLASSES))], []]]]
+
+
+def renderDocument(document, xml=True, strip=False):
+    """
+    html = renderDocument(document, xml, strip)
+    Render a document tree.
+    @param document: ['#document', namespaces, nodes], see randomDocument
+    @param xml: render well-formed xml, else force the html parser
+    @param strip: leave out the PRUNE_TAGS subtrees and comments
+    @return: html, document source
+    """
+    if strip:
+        strip = [COMMENT] + list(jqs.PRUNE_TAGS)
+        if not xml:
+            # the html parser reads processing instructions as comments
+            strip.append(PI)
+    parts = []
+    for node in document[2]:
+        if node[0] != 'body':
+            _renderNode(node, parts, strip)
+            continue
+        parts.append('<html')
+        for name, value in document[1]:
+            parts.append(' %s="%s"' % (name, value))
+        parts.append('><head><title>fuzz</title></head>')
+        if not xml and not strip:
+            # an entity unknown to xml makes pyquery fall back to lxml.html
+            parts.append('<!-- &nbsp; -->')
+        _renderNode(node, parts, strip)
+        if not xml:
+            parts.append('&nbsp;')
+        parts.append('</html>')
+    return ''.join(parts)
+
+
+def _renderNode(node, parts, strip):
+    """Append the source of node to parts, except the tags in strip."""
+    tag, attributes, children = node
+    if strip and tag in strip:
+        return
+    if tag == COMMENT:
+        parts.append('<!-- c -->')
+        return
+    if tag == PI:
+        parts.append('<?pi x?>')
+        return
+    parts.append('<' + tag)
+    for name, value in attributes:
+        parts.append(' %s="%s"' % (name, value))
+    parts.append('>')
+    for child in children:
+        _renderNode(child, parts, strip)
+        # kept when stripping, like the tail of a pruned element
+        parts.append(' ')
+    parts.append('</%s>' % tag)
+
+
+def randomSelector(rng, groups=2, chain=3):
+    """
+    selector = randomSelector(rng, groups, chain)
+    Generate a random selector.
+    @param rng: random.Random
+    @param groups: maximum number of comma separated groups
+    @param chain: maximum number of compounds per group
+    @return: selector, list of groups, each a list of (combinator,
+             compound) with compound a list of simple selectors
+    """
+    selector = []
+    for i in range(rng.randint(1, groups)):
+        group = []
+        for j in range(rng.randint(1, chain)):
+            combinator = j and rng.choice(COMBINATORS) or ''
+            group.append((combinator, _randomCompound(rng)))
+        selector.append(group)
+    return selector
+
+
+def _randomCompound(rng):
+    """Return a random list of simple selectors."""
+    compound = []
+    if rng.random() < 0.1:
+        compound.append('*')
+    elif rng.random() < 0.6:
+        compound.append(rng.choice(TAGS))
+    if rng.random() < 0.4:
+        compound.append('.' + rng.choice(CLASSES))
+    if rng.random() < 0.15:
+        compound.append('#' + rng.choice(IDS))
+    while rng.random() < 0.3:
+        name = rng.choice(sorted(ATTRIBUTES) + ['class', 'id'])
+        if rng.random() < 0.2:
+            compound.append('[%s]' % name)
+            continue
+        values = ATTRIBUTES.get(name, CLASSES + IDS)
+        compound.append('[%s%s"%s"]' % (name, rng.choice(OPERATORS),
+                                        rng.choice(values)))
+    if not compound:
+        compound.append(rng.choice(TAGS))
+    return compound
+
+
+def renderSelector(selector):
+    """
+    selectStr = renderSelector(selector)
+    Render a selector.
+    @param selector: list of groups, see randomSelector
+    @return: selectStr, JQuery-like select string
+    """
+    groups = []
+    for group in selector:
+        groups.append(''.join([combinator + ''.join(compound)
+                               for combinator, compound in group]))
+    return ', '.join(groups)
+
+
+def _evaluate(engine, html, selectStr):
+    """
+    Return the elements, or the exception type name, and the time taken.
+    """
+    start = time.perf_counter()
+    try:
+        result = engine(html, selectStr)
+    except Exception as e:
+        result = type(e).__name__
+    return result, time.perf_counter() - start
+
+
+def _compare(engine, document, selector, xml, strip):
+    """
+    Return the html, selectStr, reference and engine results of a case.
+    """
+    html = renderDocument(document, xml)
+    selectStr = renderSelector(selector)
+    expected = _evaluate(reference, renderDocument(document, xml, strip),
+                         selectStr)[0]
+    return html, selectStr, expected, _evaluate(engine, html, selectStr)[0]
+
+
+def shrink(document, selector, engine, xml=True, strip=False):
+    """
+    document, selector = shrink(document, selector, engine, xml, strip)
+    Greedily remove nodes, attributes, selector groups, compounds and
+    simple selectors while engine still disagrees with reference.
+    @param document: failing document tree
+    @param selector: failing selector
+    @param engine: engine function
+    @param xml: render the document as well-formed xml
+    @param strip: compare with reference on the document without the
+                  PRUNE_TAGS subtrees and comments
+    @return: document, selector, a minimal failing case
+    """
+    def fails(document, selector):
+        html, selectStr, expected, actual = _compare(engine, document,
+                                                     selector, xml, strip)
+        return expected != actual
+
+    changed = True
+    while changed:
+        changed = False
+        for candidate in _shrinkSelector(selector):
+            if fails(document, candidate):
+                selector = candidate
+                changed = True
+                break
+        else:
+            for candidate in _shrinkDocument(document):
+                if fails(candidate, selector):
+                    document = candidate
+                    changed = True
+                    break
+    return document, selector
+
+
+def _shrinkSelector(selector):
+    """Generate the selectors with one part less."""
+    if len(selector) > 1:
+        for i in range(len(selector)):
+            yield selector[:i] + selector[i + 1:]
+    for i, group in enumerate(selector):
+        for j in range(len(group)):
+            if len(group) > 1:
+                rest = group[:j] + group[j + 1:]
+                # the first compound has no combinator
+                rest[0] = ('', rest[0][1])
+                yield selector[:i] + [rest] + selector[i + 1:]
+            combinator, compound = group[j]
+            if len(compound) > 1:
+                for k in range(len(compound)):
+                    simple = (combinator, compound[:k] + compound[k + 1:])
+                    yield selector[:i] + \
+                        [group[:j] + [simple] + group[j + 1:]] + \
+                        selector[i + 1:]
+            if combinator not in ('', ' '):
+                descendant = (' ', compound)
+                yield selector[:i] + \
+                    [group[:j] + [descendant] + group[j + 1:]] + \
+                    selector[i + 1:]
+
+
+def _shrinkDocument(element):
+    """Generate the node trees with one node or attribute less."""
+    tag, attributes, children = element
+    for i, child in enumerate(children):
+        # the body is the root element
+        if child[0] == 'body':
+            continue
+        # remove the child, or replace it by its children
+        yield [tag, attributes, children[:i] + children[i + 1:]]
+        if child[2]:
+            yield [tag, attributes,
+                   children[:i] + child[2] + children[i + 1:]]
+    for i in range(len(attributes)):
+        yield [tag, attributes[:i] + attributes[i + 1:], children]
+    for i, child in enumerate(children):
+        for candidate in _shrinkDocument(child):
+            yield [tag, attributes,
+                   children[:i] + [candidate] + children[i + 1:]]
+
+
+class Failure(object):
+    """
+    A minimal case where an engine disagrees with reference.
+    """
+    def __init__(self, name, html, selectStr, expected, actual):
+        """
+        Constructor.
+        """
+        self.name = name
+        self.html = html
+        self.selectStr = selectStr
+        self.expected = expected
+        self.actual = actual
+
+    def __str__(self):
+        return '\n'.join(['engine: %s' % self.name,
+                          'selectStr: %s' % self.selectStr,
+                          'html: %s' % self.html,
+                          'expected: %r' % (self.expected,),
+                          'actual: %r' % (self.actual,)])
+
+
+def fuzz(iterations=100, seed=None, engines=ENGINES,
+         pruningEngines=PRUNING_ENGINES):
+    """
+    failures, timings = fuzz(iterations, seed, engines, pruningEngines)
+    Compare engines with reference on random documents and selectors.
+    @param iterations: number of random cases
+    @param seed: random seed
+    @param engines: dictionary of engine name to function(html, selectStr)
+    @param pruningEngines: same for the engines dropping the PRUNE_TAGS
+                           subtrees and comments
+    @return: failures, list of shrunk Failure, at most one per engine
+             timings, dictionary of engine name to total seconds,
+             including 'reference'
+    """
+    rng = random.Random(seed)
+    failures = {}
+    timings = dict.fromkeys(list(engines) + list(pruningEngines) +
+                            ['reference'], 0.0)
+    allEngines = [(name, engine, False) for name, engine in engines.items()]
+    allEngines += [(name, engine, True)
+                   for name, engine in pruningEngines.items()]
+    for i in range(iterations):
+        document = randomDocument(rng)
+        selector = randomSelector(rng)
+        xml = rng.random() < 0.5
+        html = renderDocument(document, xml)
+        selectStr = renderSelector(selector)
+        expected, elapsed = _evaluate(reference, html, selectStr)
+        timings['reference'] += elapsed
+        stripped = _evaluate(reference, renderDocument(document, xml, True),
+                             selectStr)[0]
+        for name, engine, strip in sorted(allEngines):
+            actual, elapsed = _evaluate(engine, html, selectStr)
+            timings[name] += elapsed
+            if actual == (stripped if strip else expected) or \
+                    name in failures:
+                continue
+            minimal = shrink(document, selector, engine, xml, strip)
+            failures[name] = Failure(name, *_compare(engine, minimal[0],
+                                                     minimal[1], xml, strip))
+    return [failures[name] for name in sorted(failures)], timings
+
+
+def main(argv=None):
+    """
+    Command line entry point.
+    """
+    parser = argparse.ArgumentParser(
+        description='Differential test and benchmark of the JQSelect engines.')
+    parser.add_argument('-n', '--iterations', type=int, default=100)
+    parser.add_argument('--seed', type=int, default=None)
+    parser.add_argument('--engine', action='append',
+                        choices=sorted(list(ENGINES) + list(PRUNING_ENGINES)),
+                        help='engine to compare, default to all')
+    args = parser.parse_args(argv)
+
+    names = args.engine or list(ENGINES) + list(PRUNING_ENGINES)
+    engines = dict([(name, ENGINES[name])
+                    for name in names if name in ENGINES])
+    pruningEngines = dict([(name, PRUNING_ENGINES[name])
+                           for name in names if name in PRUNING_ENGINES])
+    failures, timings = fuzz(args.iterations, args.seed, engines,
+                             pruningEngines)
+    for name in sorted(timings):
+        print('%-12s %8.3fs' % (name, timings[name]))
+    for failure in failures:
+        print('')
+        print(failure)
+    return failures and 1 or 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
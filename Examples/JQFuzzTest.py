@@ -0,0 +1,80 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Unit Test for JQFuzz
+
+@author Wang Qiang
+"""
+
+import random
+import unittest
+import JQSelector as jqs
+import JQFuzz as jqf
+
+
+def brokenEngine(html, selectStr):
+    """engine losing the last matched element"""
+    return jqs.JQSelect(html, selectStr)[:-1]
+
+
+class UnitTest(unittest.TestCase):
+    """
+    Test for JQFuzz
+    """
+
+    def testRender(self):
+        """
+        test for renderDocument and renderSelector
+        """
+        body = ['body', [], [['div', [('class', 'box')], []],
+                             ['script', [], []], [jqf.PI, [], []]]]
+        document = ['#document', [], [[jqf.COMMENT, [], []], body]]
+        html = jqf.renderDocument(document)
+        self.assertTrue(html.startswith('<!-- c --><html>'))
+        self.assertTrue('<body><div class="box"></div> <script></script> '
+                        '<?pi x?> </body>' in html)
+        html = jqf.renderDocument(document, strip=True)
+        self.assertTrue(html.startswith('<html>'))
+        self.assertTrue('<body><div class="box"></div>  <?pi x?> </body>'
+                        in html)
+        html = jqf.renderDocument(document, xml=False, strip=True)
+        self.assertTrue('<body><div class="box"></div>   </body>' in html)
+        selector = [[('', ['div', '.box']), (' > ', ['a'])], [('', ['p'])]]
+        self.assertEqual(jqf.renderSelector(selector), 'div.box > a, p')
+
+    def testEngines(self):
+        """
+        test that every engine agrees with reference
+        """
+        failures, timings = jqf.fuzz(200, seed=0)
+        self.assertEqual([str(failure) for failure in failures], [])
+        self.assertEqual(sorted(timings),
+                         sorted(list(jqf.ENGINES) +
+                                list(jqf.PRUNING_ENGINES) + ['reference']))
+
+    def testShrink(self):
+        """
+        test for shrinking a failing case
+        """
+        rng = random.Random(0)
+        document = jqf.randomDocument(rng)
+        document[2].append([jqf.COMMENT, [], []])
+        body = [node for node in document[2] if node[0] == 'body'][0]
+        body[2].append(['p', [('class', 'box')], []])
+        selector = [[('', ['p'])], [('', ['div']), (' ~ ', ['.box'])]]
+        document, selector = jqf.shrink(document, selector, brokenEngine)
+        self.assertEqual(len(selector), 1)
+        self.assertEqual(len(selector[0]), 1)
+        self.assertEqual(len(selector[0][0][1]), 1)
+        self.assertEqual(len(document[2]), 1)
+        self.assertEqual(len(document[2][0][2]), 1)
+        self.assertEqual(document[2][0][2][0][2], [])
+        failures, timings = jqf.fuzz(20, seed=0,
+                                     engines={'broken': brokenEngine},
+                                     pruningEngines={})
+        self.assertEqual(len(failures), 1)
+        self.assertEqual(failures[0].actual, [])
+
+if __name__ == '__main__':
+    unittest.main()
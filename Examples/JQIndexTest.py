@@ -0,0 +1,133 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Unit Test for JQIndex
+
+@author Wang Qiang
+"""
+
+import os
+import shutil
+import tempfile
+import unittest
+import JQSelector as jqs
+import JQIndex as jqi
+
+
+class UnitTest(unittest.TestCase):
+    """
+    Test for JQIndex
+    """
+
+    paths = ["test.html", "test.xml"]
+    abspaths = [os.path.abspath(path) for path in paths]
+
+    def setUp(self):
+        self.indexDir = tempfile.mkdtemp()
+        jqi.buildIndex(self.indexDir, self.paths, shardSize=1, processes=1)
+
+    def tearDown(self):
+        shutil.rmtree(self.indexDir)
+
+    def testSelectorTerms(self):
+        """
+        test for selectorTerms
+        """
+        groups = jqs.selectorTerms('div#test > div.label + li, [a!="b"]')
+        self.assertEqual(groups, [[set(['tag:div', 'id:test']),
+                                   set(['tag:div', 'class:label']),
+                                   set(['tag:li'])],
+                                  [set()]])
+        groups = jqs.selectorTerms('li:not(.group) a[href^="x y"]')
+        self.assertEqual(groups, [[set(['tag:li']),
+                                   set(['tag:a', 'attr:href'])]])
+
+    def testDocumentTerms(self):
+        """
+        test for documentTerms
+        """
+        terms = jqi.documentTerms(jqi.readDocument("test.xml"))
+        self.assertTrue('tag:note' in terms)
+        self.assertFalse('tag:div' in terms)
+        terms = jqi.documentTerms(jqi.readDocument("test.html"))
+        self.assertTrue('id:searchbox' in terms)
+        self.assertTrue('class:skiptonav' in terms)
+        self.assertTrue('attr:href' in terms)
+
+    def testCandidates(self):
+        """
+        test for CorpusIndex.candidates
+        """
+        index = jqi.CorpusIndex(self.indexDir)
+        self.assertEqual(index.shards, ['shard-00000.json',
+                                        'shard-00001.json'])
+        self.assertEqual(list(index.candidates('note > to')),
+                         self.abspaths[1:])
+        self.assertEqual(list(index.candidates('div.skiptonav')),
+                         self.abspaths[:1])
+        self.assertEqual(list(index.candidates('div.nosuchclass')), [])
+        self.assertEqual(list(index.candidates('to, #searchbox')),
+                         self.abspaths)
+        self.assertEqual(list(index.candidates('*')), self.abspaths)
+
+    def testQuery(self):
+        """
+        test for queryIndex
+        """
+        html = jqi.readDocument("test.html")
+        for selectStr in ['li.group > a', 'input#domains ~ input',
+                          'div[class="homepage-box"][id!="quote"],to']:
+            results = dict(jqi.queryIndex(self.indexDir, selectStr))
+            self.assertEqual(results[self.abspaths[0]],
+                             jqs.JQSelect(html, selectStr))
+        results = list(jqi.queryIndex(self.indexDir, 'div.nosuchclass', 1))
+        self.assertEqual(results, [])
+
+    def testRebuild(self):
+        """
+        test for indexing the same, changed and deleted documents again
+        """
+        corpusDir = tempfile.mkdtemp()
+        try:
+            path = os.path.join(corpusDir, "page.html")
+            f = open(path, 'w')
+            f.write('<html><body><p class="a">a</p></body></html>')
+            f.close()
+            index = jqi.buildIndex(self.indexDir, [path] + self.paths,
+                                   processes=1)
+            self.assertEqual(len(index.shards), 3)
+            index = jqi.buildIndex(self.indexDir, self.paths, processes=1)
+            self.assertEqual(len(index.shards), 3)
+            self.assertEqual(len(list(index.candidates('*'))), 3)
+            f = open(path, 'w')
+            f.write('<html><body><p class="bb">b</p></body></html>')
+            f.close()
+            os.utime(path, (0, 0))
+            index = jqi.buildIndex(self.indexDir, [path], processes=1)
+            self.assertEqual(list(index.candidates('p.a')), [])
+            self.assertEqual(list(index.candidates('p.bb')), [path])
+            self.assertEqual(len(list(index.candidates('*'))), 3)
+            os.remove(path)
+            results = list(index.query('p.bb, to', processes=1))
+            self.assertEqual([p for p, elements in results],
+                             self.abspaths[1:])
+            self.assertEqual(index.failed, [path])
+            argv = ['-j', '1', 'query', '-c', self.indexDir, 'p.bb, to']
+            self.assertEqual(jqi.main(argv), 1)
+        finally:
+            shutil.rmtree(corpusDir)
+
+    def testQueryErrors(self):
+        """
+        test for querying a missing index or with an invalid selector
+        """
+        missingDir = self.indexDir + '-missing'
+        self.assertRaises(IOError, jqi.CorpusIndex, missingDir)
+        self.assertFalse(os.path.exists(missingDir))
+        index = jqi.CorpusIndex(self.indexDir)
+        self.assertRaises(SyntaxError, list, index.query('html > div[', 1))
+        self.assertEqual(index.failed, [])
+
+if __name__ == '__main__':
+    unittest.main()
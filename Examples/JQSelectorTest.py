@@ -114,6 +114,100 @@ class UnitTest(unittest.TestCase):
         elements = jqs.JQSelect(html, 'div[class="homepage-box"][id!="quote"],[class~="success"]')
         self.assertEqual(len(elements), 3)
 
+    def testParseDocument(self):
+        """
+        test for parseDocument and JQSelect parse options
+        """
+        html = self.html
+        document = jqs.parseDocument(html)
+        elements = jqs.JQSelect(document, 'li.group > a')
+        self.assertEqual(len(elements), 8)
+        elements = jqs.JQSelect(html, 'script', pruneTags=jqs.PRUNE_TAGS)
+        self.assertEqual(len(elements), 0)
+        elements = jqs.JQSelect(html, 'body', removeComments=True)
+        self.assertFalse('<!--' in elements[0])
+        document = jqs.parseDocument(self.xml, pruneTags=['body'])
+        self.assertEqual(len(document('to')), 1)
+        self.assertEqual(len(document('body')), 0)
+
+    def testParseDocumentKeepSelector(self):
+        """
+        test for parseDocument with keepSelector
+        """
+        html = self.html
+        for selectStr in ['meta', 'div#searchbox', '[type="hidden"]',
+                          'input#domains ~ input', 'li a',
+                          'div#test > div.label ~ div.table > li',
+                          'div[class="homepage-box"][id!="quote"],.skiptonav']:
+            document = jqs.parseDocument(html, keepSelector=selectStr)
+            self.assertTrue(len(document('*')) < len(jqs.PyQuery(html)('*')))
+            self.assertEqual(jqs.JQSelect(document, selectStr),
+                             jqs.JQSelect(html, selectStr))
+        # keepSelector can't prune for '+' and pseudo-classes
+        for selectStr in ['input#domains + input', 'li:first']:
+            document = jqs.parseDocument(html, keepSelector=selectStr)
+            self.assertEqual(len(document('*')), len(jqs.PyQuery(html)('*')))
+
+    def testParseDocumentTrailer(self):
+        """
+        test for parseDocument with nodes after the root element
+        """
+        for xml in ['<root><a/><b/></root><!-- c -->',
+                    '<root><a/><b/></root><?pi x?>']:
+            options = [{'keepSelector': 'a'}, {'pruneTags': ['b']},
+                       {'removeComments': True}]
+            for parseOptions in options:
+                elements = jqs.JQSelect(xml, 'a', **parseOptions)
+                self.assertEqual(elements, ['<a/>'])
+        xml = '<root xmlns:x="u"><x:a>1</x:a><b/></root><!-- c -->'
+        options.append({'pruneTags': ['script']})
+        for parseOptions in options:
+            elements = jqs.JQSelect(xml, 'root', **parseOptions)
+            self.assertEqual(elements[0][:27], '<root xmlns:x="u"><x:a>1</x')
+        xml = '<feed xmlns="u"><entry><id/></entry></feed><!-- c -->'
+        elements = jqs.parseDocument(xml, removeComments=True).listOuterHtml()
+        self.assertEqual(elements,
+                         ['<feed xmlns="u"><entry><id/></entry></feed>'])
+        xml = '<feed xmlns="u" xmlns:x="v"><entry name="e"><x:id/></entry>' \
+              '</feed><!-- c -->'
+        options[0] = {'keepSelector': '[name]'}
+        for parseOptions in options:
+            elements = jqs.JQSelect(xml, '[name]', **parseOptions)
+            self.assertEqual(elements, jqs.JQSelect(xml, '[name]'))
+        elements = jqs.JQSelect(b'', 'a', pruneTags=['script'])
+        self.assertEqual(elements, [])
+        html = self.html + '<!-- generated in 0.1s -->'
+        elements = jqs.JQSelect(html, 'li.group > a', pruneTags=['script'])
+        self.assertEqual(len(elements), 8)
+
+    def testParseDocumentFallback(self):
+        """
+        test for parseDocument on input the parser target can't handle
+        """
+        xml = '<!DOCTYPE r [<!ENTITY e "ee">]><r><a>&e;</a><b/></r>'
+        elements = jqs.JQSelect(xml, 'a, b', pruneTags=['b'])
+        self.assertEqual(elements, ['<a>ee</a>'])
+        root = jqs.PyQuery(self.html)[0]
+        document = jqs.parseDocument(root, keepSelector='meta')
+        self.assertEqual(jqs.JQSelect(document, 'meta'),
+                         jqs.JQSelect(self.html, 'meta'))
+        self.assertEqual(len(jqs.PyQuery(root)('script')), 3)
+        document = jqs.parseDocument(root, pruneTags=jqs.PRUNE_TAGS)
+        self.assertEqual(len(document('script')), 0)
+        document = jqs.parseDocument(self.html)
+        elements = jqs.JQSelect(document, 'script', pruneTags=['script'])
+        self.assertEqual(elements, [])
+        self.assertEqual(len(jqs.JQSelect(document, 'script')), 3)
+        xml = '<root xmlns:x="u"><x:a>1</x:a><b/></root>'
+        document = jqs.parseDocument(jqs.PyQuery(xml)[0], pruneTags=['b'])
+        self.assertEqual(document.listOuterHtml(),
+                         ['<root xmlns:x="u"><x:a>1</x:a></root>'])
+        # lxml.html guesses the root of fragments from the unpruned body
+        html = '<!-- c --><html><head><title>t</title></head>' \
+               '<body><div></div> <div></div> </body>&nbsp;</html>'
+        elements = jqs.JQSelect(html, 'div', keepSelector='div')
+        self.assertEqual(elements, jqs.JQSelect(html, 'div'))
+
 if __name__ == '__main__':
     # Test all
     unittest.main()
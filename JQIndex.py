@@ -0,0 +1,446 @@
+#!/usr/bin/env python
+#-*- coding: utf-8 -*-
+#
+# BSD License
+# Copyright (c) 2011, Wang Qiang
+# All rights reserved.
+
+"""
+JQIndex
+
+Query a corpus of HTML/XML files with JQuery-like selectors.
+
+An on-disk inverted index maps tag, class, id and attribute names to the
+documents containing them. A query only parses the documents which carry
+every term required by one of its selectors, and evaluates them in
+parallel with JQSelect.
+
+The index is a directory of shards, each one a JSON file holding the
+absolute paths, modification times and sizes of up to shardSize documents
+and the postings of their terms. Building again over the same files only
+indexes the new and changed ones, and forgets the previous entry of a
+changed file. Queries trust the index: a file changed since the last build
+is filtered with its old terms, until build is run again. Documents which
+can't be read at query time are skipped and listed in index.failed.
+
+Function list:
+
+index = buildIndex(indexDir, paths, shardSize=1000, processes=None)
+result = mayMatch(documentTerms(html), selectStr)
+results = queryIndex(indexDir, selectStr, processes=None, **parseOptions)
+
+Command line:
+python JQIndex.py build indexDir path [path...]
+python JQIndex.py query [--prune TAG] [--keep] indexDir selectStr
+"""
+
+import os
+import re
+import sys
+import json
+import argparse
+from multiprocessing import Pool
+from lxml import etree
+from pyquery import PyQuery
+
+from JQSelector import JQSelect, elementTerms, selectorTerms
+
+
+def readDocument(path):
+    """
+    html = readDocument(path)
+    Read a document of the corpus.
+    @param path: path of the html/xml file
+    @return: html, file content in bytes
+    """
+    f = open(path, 'rb')
+    html = f.read()
+    f.close()
+    return html
+
+
+def documentTerms(html):
+    """
+    terms = documentTerms(html)
+    Collect the tag, class, id and attribute terms of a document.
+    @param html: input html/xml
+    @return: terms, set of terms in the format of selectorTerms
+    """
+    terms = set()
+    pelements = PyQuery(html)
+    if not pelements:
+        return terms
+    for el in pelements[0].getroottree().getroot().iter():
+        # skip comments and processing instructions
+        if isinstance(el.tag, str):
+            terms.update(elementTerms(el.tag, el.attrib))
+    return terms
+
+
+def mayMatch(terms, selectStr):
+    """
+    result = mayMatch(terms, selectStr)
+    Check whether a document may match selectStr.
+    @param terms: terms of the document, see documentTerms
+    @param selectStr: JQuery-like select string.
+    @return: result, False if the document can't match
+    """
+    return any(terms.issuperset(group) for group in _groupTerms(selectStr))
+
+
+def _groupTerms(selectStr):
+    """Return the terms a document needs for each selector group."""
+    return [set().union(*compounds) for compounds in selectorTerms(selectStr)]
+
+
+def _indexDocument(args):
+    """Pool worker, return the path, stats and terms of a document."""
+    path, stats = args
+    try:
+        return path, stats, documentTerms(readDocument(path))
+    except Exception:
+        # unreadable documents can't match anything
+        return path, stats, None
+
+
+def _queryDocument(args):
+    """
+    Pool worker, return the path and elements matched in a document, or
+    None if it can't be read or parsed.
+    """
+    path, selectStr, parseOptions = args
+    try:
+        return path, JQSelect(readDocument(path), selectStr, **parseOptions)
+    except (EnvironmentError, etree.LxmlError):
+        return path, None
+
+
+def _checkSelector(selectStr):
+    """
+    Raise the error of an invalid selector once, rather than from the
+    evaluation of every document.
+    """
+    pelements = PyQuery('<html/>')
+    for selector in selectStr.split(','):
+        for part in re.split(r' > | \+ | ~ ', selector.strip()):
+            pelements(part.strip())
+
+
+def _fileStats(path):
+    """Return the modification time and size of a file, or None."""
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return [stat.st_mtime, stat.st_size]
+
+
+def _imap(processes, function, iterable):
+    """
+    Map function over iterable, in a pool of processes unless processes
+    is 1.
+    """
+    if processes == 1:
+        for result in map(function, iterable):
+            yield result
+        return
+    pool = Pool(processes)
+    try:
+        for result in pool.imap(function, iterable, 16):
+            yield result
+    finally:
+        pool.terminate()
+
+
+class CorpusIndex(object):
+    """
+    Sharded inverted index over a corpus of html/xml files.
+    """
+    metaName = 'index.json'
+    shardName = 'shard-%05d.json'
+
+    def __init__(self, indexDir, create=False):
+        """
+        Constructor, open the index stored in indexDir, or create it if
+        create is set. Raise IOError if there is no index to open.
+        """
+        self.indexDir = indexDir
+        metaPath = os.path.join(indexDir, self.metaName)
+        if os.path.exists(metaPath):
+            f = open(metaPath, 'r')
+            self.shards = json.load(f)['shards']
+            f.close()
+        elif create:
+            if not os.path.isdir(indexDir):
+                os.makedirs(indexDir)
+            self.shards = []
+        else:
+            raise IOError('no index in %s' % indexDir)
+        # documents which couldn't be read by the last query
+        self.failed = []
+
+    def addDocuments(self, paths, shardSize=1000, processes=None):
+        """
+        count = index.addDocuments(paths, shardSize, processes)
+        Parse and index new documents, and documents changed since they
+        were indexed, writing a shard every shardSize documents.
+        @param paths: iterable of document paths
+        @param shardSize: maximum number of documents per shard
+        @param processes: number of worker processes, default to cpu count
+        @return: count, number of indexed documents
+        """
+        indexed = self._indexedDocuments()
+        changed = {}
+        count = 0
+        documents = []
+        stats = []
+        postings = {}
+        tasks = self._changedDocuments(paths, indexed, changed)
+        for path, stat, terms in _imap(processes, _indexDocument, tasks):
+            if terms is None:
+                continue
+            for term in terms:
+                postings.setdefault(term, []).append(len(documents))
+            documents.append(path)
+            stats.append(stat)
+            count += 1
+            if len(documents) >= shardSize:
+                self._writeShard(documents, stats, postings)
+                documents = []
+                stats = []
+                postings = {}
+        if documents:
+            self._writeShard(documents, stats, postings)
+        self._removeDocuments(changed)
+        return count
+
+    def _indexedDocuments(self):
+        """
+        Return the indexed documents, path to (shard, position, stats).
+        """
+        indexed = {}
+        for name in self.shards:
+            shard = self._readShard(name)
+            for doc, path in enumerate(shard['documents']):
+                if path is not None:
+                    indexed[path] = (name, doc, shard['stats'][doc])
+        return indexed
+
+    def _changedDocuments(self, paths, indexed, changed):
+        """
+        Generate (path, stats) for the paths which are not indexed yet or
+        changed since, adding the previous entries of the changed ones to
+        changed.
+        """
+        seen = set()
+        for path in paths:
+            path = os.path.abspath(path)
+            stats = _fileStats(path)
+            if stats is None or path in seen:
+                continue
+            seen.add(path)
+            if path in indexed:
+                if indexed[path][2] == stats:
+                    continue
+                changed[path] = indexed[path]
+            yield path, stats
+
+    def _removeDocuments(self, documents):
+        """
+        Forget the previous entries of reindexed documents, given as in
+        _indexedDocuments. Their postings are left but never followed.
+        """
+        shards = {}
+        for name, doc, stats in documents.values():
+            shards.setdefault(name, []).append(doc)
+        for name, docs in shards.items():
+            shard = self._readShard(name)
+            for doc in docs:
+                shard['documents'][doc] = None
+            f = open(os.path.join(self.indexDir, name), 'w')
+            json.dump(shard, f)
+            f.close()
+
+    def _writeShard(self, documents, stats, postings):
+        """
+        Write one shard and record it in the index metadata.
+        """
+        name = self.shardName % len(self.shards)
+        f = open(os.path.join(self.indexDir, name), 'w')
+        json.dump({'documents': documents, 'stats': stats,
+                   'postings': postings}, f)
+        f.close()
+        self.shards.append(name)
+        f = open(os.path.join(self.indexDir, self.metaName), 'w')
+        json.dump({'shards': self.shards}, f)
+        f.close()
+
+    def _readShard(self, name):
+        """
+        Read one shard.
+        """
+        f = open(os.path.join(self.indexDir, name), 'r')
+        shard = json.load(f)
+        f.close()
+        return shard
+
+    def candidates(self, selectStr):
+        """
+        paths = index.candidates(selectStr)
+        Generate the documents which may match selectStr, skipping the
+        ones missing a term required by every selector group.
+        @param selectStr: JQuery-like select string.
+        @return: paths, generator of document paths
+        """
+        groups = _groupTerms(selectStr)
+        for name in self.shards:
+            shard = self._readShard(name)
+            documents = shard['documents']
+            postings = shard['postings']
+            if not all(groups):
+                # a group requiring nothing may match any document
+                for path in documents:
+                    if path is not None:
+                        yield path
+                continue
+            matched = set()
+            for terms in groups:
+                docs = None
+                for term in terms:
+                    posting = postings.get(term, ())
+                    if docs is None:
+                        docs = set(posting)
+                    else:
+                        docs.intersection_update(posting)
+                    if not docs:
+                        break
+                matched.update(docs)
+            for doc in sorted(matched):
+                if documents[doc] is not None:
+                    yield documents[doc]
+
+    def query(self, selectStr, processes=None, **parseOptions):
+        """
+        results = index.query(selectStr, processes, **parseOptions)
+        Evaluate selectStr with JQSelect on the candidate documents.
+        @param selectStr: JQuery-like select string.
+        @param processes: number of worker processes, default to cpu count
+        @param parseOptions: pruning options of parseDocument
+        @return: results, generator of (path, elements) for the documents
+                 with at least one matched element. The documents which
+                 can't be read are listed in index.failed.
+        """
+        self.failed = []
+        _checkSelector(selectStr)
+        tasks = ((path, selectStr, parseOptions)
+                 for path in self.candidates(selectStr))
+        for path, elements in _imap(processes, _queryDocument, tasks):
+            if elements is None:
+                self.failed.append(path)
+            elif elements:
+                yield path, elements
+
+
+def buildIndex(indexDir, paths, shardSize=1000, processes=None):
+    """
+    index = buildIndex(indexDir, paths, shardSize, processes)
+    Index documents into indexDir, adding the new and changed ones to an
+    existing index.
+    @param indexDir: index directory
+    @param paths: iterable of document paths
+    @param shardSize: maximum number of documents per shard
+    @param processes: number of worker processes, default to cpu count
+    @return: index, CorpusIndex
+    """
+    index = CorpusIndex(indexDir, create=True)
+    index.addDocuments(paths, shardSize, processes)
+    return index
+
+
+def queryIndex(indexDir, selectStr, processes=None, **parseOptions):
+    """
+    results = queryIndex(indexDir, selectStr, processes, **parseOptions)
+    Query the documents of indexDir with a JQuery-like selector.
+    @param indexDir: index directory
+    @param selectStr: JQuery-like select string.
+    @param processes: number of worker processes, default to cpu count
+    @param parseOptions: pruning options of parseDocument
+    @return: results, generator of (path, elements)
+    """
+    return CorpusIndex(indexDir).query(selectStr, processes, **parseOptions)
+
+
+def _walkPaths(paths):
+    """
+    Expand directories into the files they contain, and '-' into the
+    paths read from stdin.
+    """
+    for path in paths:
+        if path == '-':
+            for line in sys.stdin:
+                if line.strip():
+                    yield line.strip()
+        elif os.path.isdir(path):
+            for root, dirs, files in os.walk(path):
+                dirs.sort()
+                for name in sorted(files):
+                    yield os.path.join(root, name)
+        else:
+            yield path
+
+
+def main(argv=None):
+    """
+    Command line entry point.
+    """
+    parser = argparse.ArgumentParser(
+        description='Query a corpus of HTML/XML files with JQuery-like selectors.')
+    parser.add_argument('-j', '--processes', type=int, default=None,
+                        help='number of worker processes')
+    commands = parser.add_subparsers(dest='command')
+    commands.required = True
+    build = commands.add_parser('build', help='index documents')
+    build.add_argument('indexDir')
+    build.add_argument('paths', nargs='+',
+                       help="files, directories, or '-' to read stdin")
+    build.add_argument('--shard-size', type=int, default=1000)
+    query = commands.add_parser('query', help='select from indexed documents')
+    query.add_argument('indexDir')
+    query.add_argument('selectStr')
+    query.add_argument('-c', '--count', action='store_true',
+                       help='only print the number of matched elements')
+    query.add_argument('--prune', action='append', default=[],
+                       metavar='TAG', help='drop TAG subtrees while parsing')
+    query.add_argument('--remove-comments', action='store_true',
+                       help='drop comments while parsing')
+    query.add_argument('--keep', action='store_true',
+                       help='only keep the subtrees which may match')
+    args = parser.parse_args(argv)
+
+    if args.command == 'build':
+        index = CorpusIndex(args.indexDir, create=True)
+        count = index.addDocuments(_walkPaths(args.paths), args.shard_size,
+                                   args.processes)
+        print('indexed %d documents' % count)
+        return 0
+    parseOptions = {'pruneTags': args.prune,
+                    'removeComments': args.remove_comments,
+                    'keepSelector': args.keep and args.selectStr or None}
+    try:
+        index = CorpusIndex(args.indexDir)
+    except IOError as e:
+        parser.error(str(e))
+    for path, elements in index.query(args.selectStr, args.processes,
+                                      **parseOptions):
+        if args.count:
+            print('%s\t%d' % (path, len(elements)))
+        else:
+            for element in elements:
+                print('%s\t%s' % (path, element))
+    for path in index.failed:
+        sys.stderr.write('can not read %s\n' % path)
+    return index.failed and 1 or 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -22,7 +22,15 @@ elements = selectByClass(html, classname)
 elements = selectById(html, id)
 
 JQuery-like Selector:
-elements = JQSelect(html, selectStr)
+elements = JQSelect(html, selectStr, **parseOptions)
+
+Parse once, select many times:
+document = parseDocument(html, pruneTags=(), removeComments=False,
+                         keepSelector=None)
+elements = JQSelect(document, selectStr)
+
+Selector analysis:
+groups = selectorTerms(selectStr)
 
 selectStr specification
 'tag.class#id[name="value"]'
@@ -40,6 +48,8 @@ selectStr specification
 """
 
 import re
+import lxml.html
+from lxml import etree
 from pyquery import PyQuery
 
 
@@ -51,31 +61,33 @@ def listHtml():
 PyQuery.fn.listOuterHtml = listHtml
 
 
-def JQSelect(html, selectStr):
+def JQSelect(html, selectStr, **parseOptions):
     """
-    elements = JQSelect(html, selectStr)
+    elements = JQSelect(html, selectStr, **parseOptions)
     Implement JQuery-like selecting function
-    @param html: input html/xml
+    @param html: input html/xml, or a document from parseDocument
     @param selectStr: JQuery-like select string.
+    @param parseOptions: pruning options of parseDocument
     @return: elements, list of matched elements
     """
+    document = parseDocument(html, **parseOptions)
     selectors = [s.strip() for s in selectStr.split(',')]
     elements = []
     for selector in selectors:
-        elements += processSingleSelector(html, selector) and \
-        processSingleSelector(html, selector) or []
+        elements += processSingleSelector(document, selector)
     return elements
 
 
-def JQSelectPQ(html, selectStr):
+def JQSelectPQ(html, selectStr, **parseOptions):
     """
-    pqelements = JQSelect(html, selectStr)
+    pqelements = JQSelect(html, selectStr, **parseOptions)
     Implement JQuery-like selecting function
-    @param html: input html/xml
+    @param html: input html/xml, or a document from parseDocument
     @param selectStr: JQuery-like select string.
+    @param parseOptions: pruning options of parseDocument
     @return: elements, list of matched elements in PyQuery type
     """
-    elements = JQSelect(html, selectStr)
+    elements = JQSelect(html, selectStr, **parseOptions)
     return [PyQuery(el) for el in elements]
 
 def processSingleSelector(html, selectStr):
@@ -204,6 +216,364 @@ def parseByProperties(html, **properties):
     return parseByTagProperties(html, "", **properties)
 
 
+# selector analysis
+_combinatorRe = re.compile(r' > | \+ | ~ ')
+_tagRe = re.compile(r'\*|[A-Za-z_][\w-]*')
+_nameRe = re.compile(r'[\.#]([\w-]+)')
+_attrRe = re.compile(r"""\[\s*([\w-]+)\s*(?:([|*~!^$]?=)\s*(?:"[^"]*"|'[^']*'|[^\]\s]*)\s*)?\]""")
+_pseudoRe = re.compile(r'::?[\w-]+')
+
+
+def compoundTerms(selectStr):
+    """
+    terms = compoundTerms(selectStr)
+    Collect the terms an element must carry to match a compound selector
+    @param selectStr: compound select string, e.g. 'div.class#id[name]'
+    @return: terms, set of 'tag:', 'class:', 'id:' and 'attr:' terms, or
+             an empty set if nothing can be required of the element
+    """
+    terms = set()
+    match = _tagRe.match(selectStr)
+    if match:
+        if match.group() != '*':
+            terms.add('tag:' + match.group().lower())
+        pos = match.end()
+    else:
+        pos = 0
+    while pos < len(selectStr):
+        match = _nameRe.match(selectStr, pos)
+        if match:
+            kind = selectStr[pos] == '.' and 'class:' or 'id:'
+            terms.add(kind + match.group(1).lower())
+            pos = match.end()
+            continue
+        match = _attrRe.match(selectStr, pos)
+        if match:
+            # [name!="value"] also matches elements without the attribute
+            if match.group(2) != '!=':
+                terms.add('attr:' + match.group(1).lower())
+            pos = match.end()
+            continue
+        match = _pseudoRe.match(selectStr, pos)
+        if match:
+            pos = _skipParentheses(selectStr, match.end())
+            if pos is not None:
+                continue
+        # unknown syntax, require nothing rather than guess
+        return set()
+    return terms
+
+
+def elementTerms(tag, attrib):
+    """
+    terms = elementTerms(tag, attrib)
+    Collect the terms carried by an element, see compoundTerms.
+    @param tag: element tag
+    @param attrib: element attributes
+    @return: terms, set of terms
+    """
+    terms = set(['tag:' + _localName(tag)])
+    for name, value in attrib.items():
+        name = _localName(name)
+        terms.add('attr:' + name)
+        if name == 'class':
+            for classname in value.split():
+                terms.add('class:' + classname.lower())
+        elif name == 'id':
+            terms.add('id:' + value.strip().lower())
+    return terms
+
+
+def _localName(name):
+    """Strip the namespace of a tag or attribute name and lower it."""
+    return name.rsplit('}', 1)[-1].lower()
+
+
+def _skipParentheses(selectStr, pos):
+    """
+    Return the position after a balanced parenthesised argument starting
+    at pos, pos itself if there is none, or None if it is unbalanced.
+    """
+    if not selectStr.startswith('(', pos):
+        return pos
+    depth = 0
+    for i in range(pos, len(selectStr)):
+        if selectStr[i] == '(':
+            depth += 1
+        elif selectStr[i] == ')':
+            depth -= 1
+            if not depth:
+                return i + 1
+    return None
+
+
+def _splitCompounds(selectStr):
+    """
+    Split a selector on descendant whitespace, ignoring whitespace inside
+    brackets, parentheses and quotes.
+    """
+    compounds = []
+    current = ''
+    depth = 0
+    quote = None
+    for char in selectStr:
+        if quote:
+            if char == quote:
+                quote = None
+        elif char in '"\'':
+            quote = char
+        elif char in '[(':
+            depth += 1
+        elif char in '])':
+            depth -= 1
+        elif char.isspace() and not depth:
+            if current:
+                compounds.append(current)
+            current = ''
+            continue
+        current += char
+    if current:
+        compounds.append(current)
+    return compounds
+
+
+def selectorTerms(selectStr):
+    """
+    groups = selectorTerms(selectStr)
+    Collect the terms required by each compound of a JQuery-like selector.
+    An element can only match a compound if it carries all of its terms,
+    and a document can only match a group if it contains every compound.
+    @param selectStr: JQuery-like select string.
+    @return: groups, one list of term sets per comma separated selector
+    """
+    groups = []
+    for selector in [s.strip() for s in selectStr.split(',')]:
+        compounds = []
+        for part in _combinatorRe.split(selector):
+            for compound in _splitCompounds(part):
+                if compound not in ('>', '+', '~'):
+                    compounds.append(compoundTerms(compound))
+        groups.append(compounds)
+    return groups
+
+
+# pruning parser
+# subtrees which usually can't match a selector but take a lot of memory
+PRUNE_TAGS = ('script', 'style', 'svg')
+
+
+def parseDocument(html, pruneTags=(), removeComments=False,
+                  keepSelector=None):
+    """
+    document = parseDocument(html, pruneTags, removeComments, keepSelector)
+    Parse html/xml once, dropping subtrees while parsing. Pruned elements
+    are absent from the document, so they can't be matched, are missing
+    from the matched html and don't count as siblings.
+    Parsed documents and elements are pruned into a copy. Xml with an
+    internal DTD subset, whose entities a parser target can't expand, and
+    html fragments, which lxml.html guesses the root of from their
+    content, are parsed as usual by PyQuery and pruned after. Neither
+    saves memory.
+    @param html: input html/xml, lxml elements or a parsed document
+    @param pruneTags: names of the elements to drop with their subtree,
+                      e.g. PRUNE_TAGS
+    @param removeComments: drop comments too
+    @param keepSelector: JQuery-like select string, only keep the
+                         elements which may match it with their ancestors
+                         and descendants. Ignored for selectors whose
+                         result depends on the dropped elements ('+' and
+                         pseudo-classes).
+    @return: document, PyQuery of the document root
+    """
+    compounds = keepSelector and _keepCompounds(keepSelector)
+    if not pruneTags and not removeComments and not compounds:
+        if isinstance(html, PyQuery):
+            return html
+        return PyQuery(html)
+    options = (pruneTags, removeComments, compounds)
+    if not isinstance(html, (str, bytes)):
+        return _pruneDocument(html, options)
+    if not html.strip():
+        return PyQuery([])
+    text = html.decode('latin-1') if isinstance(html, bytes) else html
+    if _internalSubsetRe.search(text):
+        return _pruneDocument(html, options)
+    # same fallback as pyquery, xml first then html
+    try:
+        parser = etree.XMLParser(target=PruningTarget(*options))
+        root = etree.fromstring(html, parser)
+    except etree.XMLSyntaxError:
+        if not _fullHtmlRe.match(text):
+            return _pruneDocument(html, options)
+        target = PruningTarget(*options, parser=lxml.html.html_parser)
+        parser = lxml.html.HTMLParser(target=target)
+        root = lxml.html.fromstring(html, parser=parser)
+    return PyQuery(root)
+
+
+_internalSubsetRe = re.compile(r'<!DOCTYPE[^>\[]*\[', re.I)
+# lxml.html.fromstring returns these as parsed, without guessing the root
+_fullHtmlRe = re.compile(r'\s*<(?:html|!doctype)', re.I)
+
+
+def _pruneDocument(html, options):
+    """
+    Parse html with PyQuery, then return a pruned copy.
+    """
+    return PyQuery([_pruneElement(el, options) for el in PyQuery(html)])
+
+
+def _pruneElement(element, options):
+    """
+    Return a pruned copy of a parsed element, replaying its events to a
+    PruningTarget.
+    """
+    if isinstance(element, lxml.html.HtmlElement):
+        target = PruningTarget(*options, parser=lxml.html.html_parser)
+    else:
+        target = PruningTarget(*options)
+    docinfo = element.getroottree().docinfo
+    target.doctype(docinfo.root_name, docinfo.public_id, docinfo.system_url)
+    _replayElement(element, target)
+    return target.close()
+
+
+def _replayElement(element, target):
+    """Send the parser events of element, without its tail, to target."""
+    if element.tag is etree.Comment:
+        target.comment(element.text)
+        return
+    if element.tag is etree.PI:
+        target.pi(element.target, element.text)
+        return
+    if not isinstance(element.tag, str):
+        # entity references
+        return
+    target.start(element.tag, dict(element.attrib), element.nsmap)
+    if element.text:
+        target.data(element.text)
+    for child in element:
+        _replayElement(child, target)
+        if child.tail:
+            target.data(child.tail)
+    target.end(element.tag)
+
+
+def _keepCompounds(keepSelector):
+    """
+    Return the compound term sets of keepSelector if they allow pruning,
+    else None.
+    """
+    if ':' in keepSelector or ' + ' in keepSelector:
+        return None
+    compounds = []
+    for group in selectorTerms(keepSelector):
+        compounds += group
+    if not all(compounds):
+        # a compound requiring nothing may match any element
+        return None
+    return compounds
+
+
+class PruningTarget(object):
+    """
+    lxml parser target building the tree without the pruned subtrees.
+    """
+    def __init__(self, pruneTags=(), removeComments=False, compounds=None,
+                 parser=None):
+        """
+        Constructor.
+        @param pruneTags: names of the elements to drop with their subtree
+        @param removeComments: drop comments too
+        @param compounds: keep only the elements carrying all the terms of
+                          one of these sets, with their ancestors and
+                          descendants
+        @param parser: lxml parser looking up the element classes
+        """
+        self.builder = etree.TreeBuilder(parser=parser)
+        self.pruneTags = set([tag.lower() for tag in pruneTags])
+        self.removeComments = removeComments
+        self.compounds = compounds
+        # depth of the built tree, and inside a pruned subtree
+        self.depth = 0
+        self.skipDepth = 0
+        # per open element, [may match or inside a match, keep]
+        self.stack = []
+        self.doctypeIds = None
+        self.root = None
+
+    def start(self, tag, attrib, nsmap=None):
+        """Element start event."""
+        # the root element is never pruned
+        if self.skipDepth or self.depth and _localName(tag) in self.pruneTags:
+            self.skipDepth += 1
+            return
+        self.depth += 1
+        if nsmap:
+            # the parser gives the default namespace as '', lxml wants None
+            nsmap = dict([(prefix or None, uri)
+                          for prefix, uri in nsmap.items()])
+        element = self.builder.start(tag, attrib, nsmap)
+        if self.root is None:
+            self.root = element
+        if self.compounds is None:
+            return
+        relevant = bool(self.stack) and self.stack[-1][0]
+        if not relevant:
+            terms = elementTerms(tag, attrib)
+            relevant = any(terms.issuperset(c) for c in self.compounds)
+        self.stack.append([relevant, relevant])
+
+    def end(self, tag):
+        """Element end event."""
+        if self.skipDepth:
+            self.skipDepth -= 1
+            return
+        self.depth -= 1
+        element = self.builder.end(tag)
+        if self.compounds is None:
+            return element
+        keep = self.stack.pop()[1]
+        if not self.stack:
+            return element
+        if keep:
+            self.stack[-1][1] = True
+        else:
+            element.getparent().remove(element)
+        return element
+
+    def data(self, data):
+        """Text event."""
+        if not self.skipDepth:
+            self.builder.data(data)
+
+    def comment(self, text):
+        """Comment event."""
+        if not self.skipDepth and not self.removeComments:
+            self.builder.comment(text)
+
+    def pi(self, target, data=None):
+        """Processing instruction event."""
+        if not self.skipDepth:
+            self.builder.pi(target, data)
+
+    def doctype(self, name, pubid, system):
+        """Doctype event."""
+        self.doctypeIds = (pubid, system)
+
+    def close(self):
+        """Return the root element."""
+        # the builder returns the last top-level node, which may be a
+        # comment or processing instruction after the root element
+        self.builder.close()
+        root = self.root
+        # keep the doctype, it switches lxml to xhtml serialization
+        if self.doctypeIds and any(self.doctypeIds):
+            docinfo = root.getroottree().docinfo
+            docinfo.public_id, docinfo.system_url = self.doctypeIds
+        return root
+
+
 # Implement strategy pattern
 class SelectOperation(object):
     """
@@ -41,6 +41,7 @@ __version__ = '1.0'
 __author__ = 'Wang Qiang'
 __license__ = 'BSD License'
 
-__all__ = ['JQSelector']
+__all__ = ['JQSelector', 'JQIndex', 'JQFuzz']
 
 from JQSelector import JQSelect 
+from JQIndex import buildIndex, queryIndex